@@ -4,10 +4,13 @@ import argparse
 import configparser
 import csv
 import logging
+import operator
 import sys
 
 import netdiag
 
+# Spreadsheet values treated as "yes" in flag columns such as On Campus
+TRUE_VALUES = frozenset({'x', 'y', 'yes', 'true', '1', 'on campus'})
 
 
 def read_config(filename):
@@ -42,9 +45,7 @@ def parse_args():
     parser.add_argument(
         "-o",
         "--outfile",
-        help="Output file",
-        default=sys.stdout,
-        type=argparse.FileType("w"),
+        help="Output file (default: standard output)",
     )
     parser.add_argument(
         "-C", "--config_file", help="Name of config file", default="config.ini"
@@ -54,50 +55,66 @@ def parse_args():
     )
     return parser.parse_args()
 
-def read_dataflows(filename):
-    """Reads CSV file of data flow information, returns list"""
+def select_columns(header, *names):
+    """Return a callable that picks the named columns out of a CSV row"""
+
+    idx = {name: i for i, name in enumerate(header)}
+    return operator.itemgetter(*(idx[name] for name in names))
+
+def read_rows(filename, *names):
+    """Reads CSV file, yields a tuple of the named columns for each row"""
+
+    with open(filename, newline='', encoding='utf-8-sig',
+              buffering=1 << 20) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return
+        cols = select_columns(header, *names)
+        n = len(header)
+        for row in reader:
+            if row:
+                # Exports and hand edits may trim empty trailing cells
+                if len(row) < n:
+                    row += [''] * (n - len(row))
+                yield cols(row)
+
+def read_dataflow_rows(filename):
+    """Reads CSV file of data flow information, yields (source, target, mode)
 
-    dataflows = []
+    Source and target are returned as system codes.
+    """
 
-    with open(filename) as csvfile:
-        sys_reader = csv.DictReader(csvfile)
-        for row in sys_reader:
-            if row['source'] and row['target']:
-                src = netdiag.to_code(row['source'])
-                trgt = netdiag.to_code(row['target'])
-                mode = row['mode']
-                df = netdiag.DataFlow(src, trgt, mode)
-                dataflows.append(df)
-    return dataflows
+    for source, target, mode in read_rows(filename, 'source', 'target', 'mode'):
+        if source and target:
+            yield netdiag.to_code(source), netdiag.to_code(target), mode
+
+def read_dataflows(filename):
+    """Reads CSV file of data flow information, yields DataFlow objects"""
+
+    for src, trgt, mode in read_dataflow_rows(filename):
+        yield netdiag.DataFlow(src, trgt, mode)
 
 def read_environments(filename):
     """Reads CSV file of environment information, returns dictionary"""
 
     environments = []
 
-    with open(filename) as csvfile:
-        sys_reader = csv.DictReader(csvfile)
-        for row in sys_reader:
-            if row['Environment']:
-                code = netdiag.to_code(row['Environment'])
-                env = netdiag.Environment(code, row['Environment'],
-                                          row['Host'], bool(row['On Campus']))
-                environments.append(env)
+    for name, host, oncampus in read_rows(filename, 'Environment', 'Host', 'On Campus'):
+        if name:
+            code = netdiag.to_code(name)
+            oncampus = oncampus.strip().lower() in TRUE_VALUES
+            env = netdiag.Environment(code, name, host, oncampus)
+            environments.append(env)
     return environments
 
 def read_systems(filename):
-    """Reads CSV file of system information, returns dictionary"""
+    """Reads CSV file of system information, yields System objects"""
 
-    systems = []
-
-    with open(filename) as csvfile:
-        sys_reader = csv.DictReader(csvfile)
-        for row in sys_reader:
-            if row['System']:
-                code = netdiag.to_code(row['System'])
-                s = netdiag.System(code, row['System'], row['Environment'])
-                systems.append(s)
-    return systems
+    for name, environment in read_rows(filename, 'System', 'Environment'):
+        if name:
+            code = netdiag.to_code(name)
+            yield netdiag.System(code, name, environment)
 
 def parse_data(line):
     """Placeholder function for parsing input data"""
@@ -119,16 +136,20 @@ def main():
     # dataflow. There are dependencies among the data and how it is
     # interpreted.
 
-    network = netdiag.Network('ILS')
-    for e in read_environments(args.environments):
-        network.add_environment(e)
-    for s in read_systems(args.systems):
-        network.add_system(s)
-    for df in read_dataflows(args.data_flow):
-        network.add_dataflow(df)
+    network = netdiag.Network.from_csv_rows(
+        'ILS',
+        read_environments(args.environments),
+        read_systems(args.systems),
+        read_dataflow_rows(args.data_flow),
+    )
 
-    dot = network.digraph2()
-    print(dot.render(format='png'))
+    dot = network.source()
+    png = dot.pipe(format='png')
+    if args.outfile:
+        with open(args.outfile, 'wb') as outfile:
+            outfile.write(png)
+    else:
+        sys.stdout.buffer.write(png)
 
     return 0
 
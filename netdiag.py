@@ -5,22 +5,30 @@ network of applications and their exchange of data. Can read in data
 from a set of CSV files and output into the DOT language used by
 Graphviz.
 
-Currently most objects provide two methods for interacting with the graphviz library:
-
-`add_to_graph()`: The object receives a Graph or Digraph object and adds itself to the graph.
-`digraph()`: the object creates a Digraph object that represents it, and the caller adds the result to the graph.
-
-These two options have a different feel.
-Returning an object that the caller will dispose of has a more composable feel, but the other method produces much tigheter DOT code.
-
-Will need to decide on one or the other.
-
-Meanwhile, either seem preferable to the original approach of formatting the DOT string directly.
+Environment, System and DataFlow provide `add_to_graph()` for interacting
+with the graphviz library: the object receives a Graph or Digraph object
+and adds itself to the graph. Environment also provides `digraph()`, which
+creates a cluster Digraph that represents it for the caller to add to the
+graph.
+
+Objects also provide `write_to()`, which writes the object's DOT source
+to a file-like object (`to_dot()` returns the same text as a string).
+`Network.write_dot()` streams the whole network this way and is the
+canonical output path; `Network.source()` wraps its output in a
+`graphviz.Source` for rendering. It skips building the graphviz object
+tree, so `Network.digraph()` and `Network.digraph2()` are deprecated.
 """
 
+import array
+import io
+import operator
+import sys
+import warnings
+from functools import lru_cache
+
 import graphviz
 
-system_fieldnames=["System",
+system_fieldnames=("System",
                    "Environment",
                    "Descr",
                    "Functional Owner",
@@ -33,20 +41,58 @@ system_fieldnames=["System",
                    "Circ",
                    "License",
                    "Notes"
-                   ]
+                   )
 
+_code_table = str.maketrans(' .', '__')
+
+@lru_cache(maxsize=None)
 def to_code(token: str):
-    """Creates a lower-case 'code' from a string."""
+    """Creates a lower-case 'code' from a string.
+
+    Results are cached, since the same system and environment names
+    recur across every CSV file and dataflow, and interned, so codes
+    used as dict keys compare by identity.
+    """
+
+    return sys.intern(token.lower().translate(_code_table))
+
+def _quote(token: str) -> str:
+    """Returns token as a double-quoted DOT ID, escaping any double quotes."""
 
-    return token.lower().replace(' ','_').replace('.','_')
+    return '"' + token.replace('"', '\\"') + '"'
+
+# Indentation strings for nested DOT output, indexed by width in spaces
+_pads = tuple(' ' * n for n in range(64))
+
+def _pad(indent: int) -> str:
+    """Returns a string of indent spaces, shared for common widths."""
+
+    return _pads[indent] if indent < len(_pads) else ' ' * indent
+
+# DOT templates for the fixed lines of an Environment cluster
+_env_header = ('{pad}subgraph {id} {{\n'
+               '{pad2}label={label};\n'
+               '{pad2}labelloc="b";\n'
+               '{pad2}style="dashed";\n')
+_env_campus = ('{pad2}color="maroon";\n'
+               '{pad2}fontcolor="maroon";\n')
 
 class Environment:
     """Represents an environment in which software systems are hosted."""
 
+    __slots__ = ('code', 'name', 'host', 'oncampus', 'systems')
+
+    # Cluster attributes other than the label, off campus and on campus
+    _cluster_attr = (
+        {'labelloc': 'b', 'style': 'dashed'},
+        {'labelloc': 'b', 'style': 'dashed',
+         'color': 'maroon', 'fontcolor': 'maroon'},
+    )
+
     def __init__(self, code: str, name: str, host: str, oncampus: bool):
         """Initializes an environment."""
 
-        self.code = code
+        self.code = sys.intern(code)
         self.name = name
         self.host = host
         self.oncampus = oncampus
@@ -59,19 +105,12 @@ class Environment:
     def digraph(self) -> graphviz.Digraph:
         """Return a Digraph that represents this Environment as a cluster."""
 
-        cluster_attr = {
-            'label': self.name,
-            'labelloc': 'b',
-            'style': 'dashed',
-        }
-        if self.oncampus:
-            cluster_attr |= {'color': 'maroon','fontcolor': 'maroon'}
+        cluster_attr = {'label': self.name, **self._cluster_attr[bool(self.oncampus)]}
 
         c = graphviz.Digraph(name=f'cluster_{self.code}',
                              graph_attr=cluster_attr)
         for system in self.systems:
-            s = system.digraph()
-            c.subgraph(s)
+            system.add_to_graph(c)
         return c
 
     def add_to_graph(self, dot):
@@ -80,19 +119,40 @@ class Environment:
         Arguments:
         dot: graphviz context manager, result of Graph.subgraph()
         """
-        cluster_attr = {
-            'label': self.name,
-            'labelloc': 'b',
-            'style': 'dashed',
-        }
-        if self.oncampus:
-            cluster_attr |= {'color': 'maroon','fontcolor': 'maroon'}
+
+        cluster_attr = {'label': self.name, **self._cluster_attr[bool(self.oncampus)]}
 
         with dot.subgraph(name=f'cluster_{self.code}',
                           graph_attr=cluster_attr) as c:
             for s in self.systems:
                 s.add_to_graph(c)
 
+    def write_to(self, out, indent: int = 2) -> None:
+        """Writes this Environment as a DOT cluster subgraph to out.
+
+        Arguments:
+        out: object with a write() method, e.g. an open file or io.StringIO
+        indent: number of spaces to indent the subgraph by
+        """
+
+        pad = _pad(indent)
+        pad2 = _pad(indent + 2)
+        out.write(_env_header.format(pad=pad, pad2=pad2,
+                                     id=_quote(f'cluster_{self.code}'),
+                                     label=_quote(self.name)))
+        if self.oncampus:
+            out.write(_env_campus.format(pad2=pad2))
+        for s in self.systems:
+            s.write_to(out, indent + 2)
+        out.write(f'{pad}}}\n')
+
+    def to_dot(self, indent: int = 2) -> str:
+        """Return the DOT source for this Environment as a cluster subgraph."""
+
+        buf = io.StringIO()
+        self.write_to(buf, indent)
+        return buf.getvalue().rstrip('\n')
+
 
 class System:
     """Represents a software system in this network.
@@ -103,8 +163,15 @@ class System:
         name: The name used as the label of this system in a diagram
         environment: The name of the environment this system is hosted in,
           may be None.
+        env_code: The code of that environment, or None.
+        label: The name as displayed in a diagram, one word per line.
     """
 
+    __slots__ = ('code', 'name', 'environment', 'env_code', 'label')
+
+    # Node shape used for every System in a diagram
+    shape = "box"
+
     def __init__(self, code: str, name: str, environment: str):
         """Initializes System object.
 
@@ -117,19 +184,11 @@ class System:
 
         """
 
-        self.code = code
+        self.code = sys.intern(code)
         self.name = name
         self.environment = environment
-
-    def digraph(self) -> graphviz.Digraph:
-        """Return a Digraph that represents this System as a cluster."""
-
-        label = self.name.replace(' ','\\n')
-        shape = "box"
-
-        sg = graphviz.Digraph(f'sg_{self.code}')
-        sg.node(self.code, label, shape=shape)
-        return sg
+        self.env_code = to_code(environment) if environment else None
+        self.label = name.replace(' ','\\n')
 
     def add_to_graph(self, dot):
         """Adds this System to the given Dot object, a Graph or Digraph.
@@ -138,99 +197,261 @@ class System:
         dot: Dot obect, a Graph or Digraph (or a context manager from Dot.subgraph())
         """
 
-        label = self.name.replace(' ','\\n')
-        shape = "box"
-        dot.node(self.code, label, shape=shape)
+        # Append the preformatted statement rather than calling dot.node(),
+        # which quotes and formats an attribute dict for every node.
+        dot.body.append(f'\t{_quote(self.code)} [label={_quote(self.label)} shape={self.shape}]\n')
+
+    def write_to(self, out, indent: int = 2) -> None:
+        """Writes this System as a DOT node statement to out."""
+
+        pad = _pad(indent)
+        out.write(f'{pad}{_quote(self.code)} [label={_quote(self.label)}, shape={self.shape}];\n')
+
+    def to_dot(self, indent: int = 2) -> str:
+        """Return the DOT source for this System as a node statement."""
+
+        buf = io.StringIO()
+        self.write_to(buf, indent)
+        return buf.getvalue().rstrip('\n')
 
 class DataFlow:
     """Represents the flow of data between two systems.
 
     Attributes:
-      source: source system of the data.
-      target: target systems, where the data lands.
+      source: code of the source system of the data.
+      target: code of the target system, where the data lands.
       mode: read ('r') or write ('w'), i.e. does this merely read, or does it update data storage?
+      style: edge style used to draw this DataFlow, dashed for reads.
     """
 
+    __slots__ = ('source', 'target', 'mode', 'style')
+
+    # Edge style for each mode; anything other than a read is drawn solid
+    _styles = {'r': 'dashed'}
+
     def __init__(self, source: str, target: str, mode: str):
         """Initializes this DataFlow."""
 
         self.source = source
         self.target = target
         self.mode = mode
-
+        self.style = self._styles.get(mode, 'solid')
 
     def add_to_graph(self, dot):
         """Adds this DataFlow as an edge to the Dot graph."""
 
-        s = to_code(self.source)
-        t = to_code(self.target)
-        style = 'dashed' if self.mode == 'r' else 'solid'
-        dot.edge(s, t, style=style)
+        dot.edge(self.source, self.target, style=self.style)
+
+    def write_to(self, out, indent: int = 2) -> None:
+        """Writes this DataFlow as a DOT edge statement to out."""
+
+        pad = _pad(indent)
+        out.write(f'{pad}{_quote(self.source)} -> {_quote(self.target)} [style={self.style}];\n')
+
+    def to_dot(self, indent: int = 2) -> str:
+        """Return the DOT source for this DataFlow as an edge statement."""
+
+        buf = io.StringIO()
+        self.write_to(buf, indent)
+        return buf.getvalue().rstrip('\n')
+
+_dataflow_fields = operator.attrgetter('source', 'target', 'mode')
 
 class Network:
-    """This class represents a network with nodes, clusters, and edges."""
+    """This class represents a network with nodes, clusters, and edges.
+
+    DataFlows are not kept as objects. The dataflows attribute is a
+    read-only snapshot rebuilt on each access. Add flows with
+    add_dataflow(), or with add_dataflow_row() and add_dataflows() for
+    bulk loading.
+    """
+
+    __slots__ = ('name', 'environments', '_env_index', 'systems',
+                 '_df_src', '_df_tgt', '_df_mode')
+
+    # DataFlow modes are stored as one byte each: 0 for reads, 1 for writes.
+    # These are indexed by that flag.
+    _modes = ('r', 'w')
+    _styles = ('dashed', 'solid')
 
     def __init__(self, name: str):
         """Initializes this Environment.
 
         Attributes:
           name: Name used for this Network diagram.
-          environments: hosting Environments represented in this Network.
+          environments: hosting Environments represented in this Network,
+            in the order they were added.
           systems: Systems in this Network not otherwise in an Environment.
-          dataflows: DataFlows in this Network.
+          dataflows: read-only tuple of the DataFlows in this Network,
+            rebuilt on each access; use add_dataflow() to add one. They
+            are stored as parallel lists of source and target codes plus
+            a byte array of read/write flags; any mode other than 'r'
+            counts as 'w'.
         """
 
         self.name = name
-        self.environments={}
+        self.environments = []
+        self._env_index = {}
         self.systems={}
-        self.dataflows = []
+        self._df_src = []
+        self._df_tgt = []
+        self._df_mode = array.array('b')
+
+    @classmethod
+    def from_csv_rows(cls, name: str, environments, systems, flows):
+        """Builds a Network in bulk from parsed CSV data.
+
+        Arguments:
+        name: Name used for the Network diagram.
+        environments: iterable of Environments.
+        systems: iterable of Systems, consumed after the environments so
+          each can be placed in its Environment.
+        flows: iterable of (source code, target code, mode) tuples.
+        """
+
+        n = cls(name)
+        by_code = {e.code: e for e in environments}
+        n.environments = list(by_code.values())
+        n._env_index = {code: i for i, code in enumerate(by_code)}
+        for system in systems:
+            n.add_system(system)
+        n._extend_dataflows(list(flows))
+        return n
+
+    @property
+    def dataflows(self) -> tuple:
+        """Snapshot of the DataFlows in this Network.
+
+        Returned as a tuple, so attempts to append to it fail rather than
+        being silently lost. Use add_dataflow() to add flows.
+        """
+
+        modes = self._modes
+        return tuple(DataFlow(src, tgt, modes[flag])
+                     for src, tgt, flag in zip(self._df_src, self._df_tgt, self._df_mode))
 
     def add_dataflow(self, df) -> None:
         """Adds a DataFlow to this Network."""
 
-        self.dataflows.append(df)
+        self.add_dataflow_row(df.source, df.target, df.mode)
+
+    def add_dataflow_row(self, source: str, target: str, mode: str) -> None:
+        """Adds a data flow to this Network without building a DataFlow.
+
+        Arguments:
+        source: code of the source system
+        target: code of the target system
+        mode: 'r' or 'w', as for DataFlow
+        """
+
+        self._df_src.append(source)
+        self._df_tgt.append(target)
+        self._df_mode.append(mode != 'r')
+
+    def add_dataflows(self, dfs) -> None:
+        """Adds an iterable of DataFlows to this Network in one pass."""
+
+        self._extend_dataflows(list(map(_dataflow_fields, dfs)))
+
+    def _extend_dataflows(self, rows: list) -> None:
+        """Adds a list of (source, target, mode) tuples to the parallel lists."""
+
+        if rows:
+            src, tgt, mode = zip(*rows)
+            self._df_src.extend(src)
+            self._df_tgt.extend(tgt)
+            self._df_mode.extend([m != 'r' for m in mode])
+
+    def _edges(self):
+        """Yields (source, target, style) for each DataFlow in this Network."""
+
+        styles = self._styles
+        for src, tgt, flag in zip(self._df_src, self._df_tgt, self._df_mode):
+            yield src, tgt, styles[flag]
 
     def add_environment(self, environment: Environment) -> None:
         """Adds Environments to this Network."""
 
-        self.environments[environment.code] = environment
+        i = self._env_index.get(environment.code)
+        if i is None:
+            self._env_index[environment.code] = len(self.environments)
+            self.environments.append(environment)
+        else:
+            self.environments[i] = environment
 
     def add_system(self, system: System) -> None:
         """Adds Systems to this Network."""
 
-        env_code = to_code(system.environment)
-        if env_code in self.environments:
-            self.environments[env_code].add_system(system)
+        i = self._env_index.get(system.env_code)
+        if i is not None:
+            self.environments[i].add_system(system)
         else:
             self.systems[system.code] = system
 
 
     def digraph(self):
         """Walk the Network and build up a graphviz object.
+
+        Deprecated: use source() or write_dot().
         """
 
+        warnings.warn('Network.digraph() is deprecated, use source()',
+                      DeprecationWarning, stacklevel=2)
         dot = graphviz.Digraph(self.name)
-        for environment in self.environments.values():
+        for environment in self.environments:
             e = environment.digraph()
             dot.subgraph(e)
         for system in self.systems.values():
-            s = system.digraph()
-            dot.subgraph(s)
+            system.add_to_graph(dot)
 
-        for df in self.dataflows:
-            df.add_to_graph(dot)
+        for src, tgt, style in self._edges():
+            dot.edge(src, tgt, style=style)
 
         return dot
 
     def digraph2(self) -> graphviz.graphs.BaseGraph:
-        """Walk the Network and build up a graphviz object."""
+        """Walk the Network and build up a graphviz object.
+
+        Deprecated: use source() or write_dot().
+        """
 
+        warnings.warn('Network.digraph2() is deprecated, use source()',
+                      DeprecationWarning, stacklevel=2)
         dot = graphviz.Digraph(self.name)
-        for e in self.environments.values():
+        for e in self.environments:
             e.add_to_graph(dot)
         for system in self.systems.values():
             system.add_to_graph(dot)
-        for df in self.dataflows:
-            df.add_to_graph(dot)
+        for src, tgt, style in self._edges():
+            dot.edge(src, tgt, style=style)
 
         return dot
+
+    def write_dot(self, out) -> None:
+        """Write this Network as DOT source to a file-like object.
+
+        Arguments:
+        out: object with a write() method, e.g. an open file or io.StringIO
+
+        Unless out is already an io.StringIO, the many small statement
+        writes are collected in memory and passed to out in one write().
+        """
+
+        buf = out if isinstance(out, io.StringIO) else io.StringIO()
+        buf.write(f'digraph {_quote(self.name)} {{\n')
+        for e in self.environments:
+            e.write_to(buf)
+        for system in self.systems.values():
+            system.write_to(buf)
+        buf.write(''.join([f'  {_quote(src)} -> {_quote(tgt)} [style={style}];\n'
+                           for src, tgt, style in self._edges()]))
+        buf.write('}\n')
+        if buf is not out:
+            out.write(buf.getvalue())
+
+    def source(self) -> graphviz.Source:
+        """Return this Network's DOT source as a graphviz.Source for rendering."""
+
+        buf = io.StringIO()
+        self.write_dot(buf)
+        return graphviz.Source(buf.getvalue())